@@ -1,40 +1,87 @@
 # backend/server.py
-from fastapi import FastAPI, APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, BackgroundTasks, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.routing import APIRoute
 from dotenv import load_dotenv
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError
+from pymongo.write_concern import WriteConcern
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional, Dict, Any
-from datetime import datetime, timezone, timedelta
-import bcrypt, jwt, os, uuid, logging
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, TypeAdapter
+from typing import List, Optional, Dict, Any, Callable
+from datetime import datetime, timezone
+from cachetools import TTLCache
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from concurrent.futures import ThreadPoolExecutor
+import asyncio, bcrypt, orjson, jwt, os, uuid, logging, hashlib, threading, time
 
 # ==================== CONFIG ====================
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / ".env")
 
+def _available_cpus() -> int:
+    # Honors CPU affinity / cpusets (e.g. containers), unlike os.cpu_count().
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
 MONGO_URL = os.getenv("MONGO_URL", "").strip()
 DB_NAME = os.getenv("DB_NAME", "oops_db").strip()
+# Worker processes on this host. MONGO_MAX_POOL / MONGO_MIN_POOL (and the hash
+# pool below) are per-host budgets split across them, so N workers do not open
+# N times the connections. Set this instead of passing `uvicorn --workers`,
+# which workers cannot see.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+MONGO_MAX_POOL = max(1, int(os.getenv("MONGO_MAX_POOL", 50)) // WEB_CONCURRENCY)
+MONGO_MIN_POOL = min(MONGO_MAX_POOL, int(os.getenv("MONGO_MIN_POOL", 8)) // WEB_CONCURRENCY)
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zstd,zlib")
 SECRET_KEY = os.getenv("JWT_SECRET", "your-secret-key-change-in-production")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 60 * 24 * 7))
+JWT_CACHE_TTL = int(os.getenv("JWT_CACHE_TTL", 30))
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", 2))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", 64 * 1024))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", 1))
+# Each in-flight Argon2 hash holds ARGON2_MEMORY_COST KiB, so the hash pool is
+# capped by a per-process memory budget as well as by this worker's CPU share.
+HASH_MEMORY_BUDGET_MB = int(os.getenv("HASH_MEMORY_BUDGET_MB", 512))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", 0)) or max(1, min(
+    _available_cpus() // WEB_CONCURRENCY,
+    HASH_MEMORY_BUDGET_MB * 1024 // ARGON2_MEMORY_COST,
+))
+LISTING_CACHE_TTL = int(os.getenv("LISTING_CACHE_TTL", 60))
+
+# Motor sizes its thread pool from MOTOR_MAX_WORKERS when it is first imported,
+# so match it to the connection pool before the import below.
+os.environ.setdefault("MOTOR_MAX_WORKERS", str(MONGO_MAX_POOL))
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
 
 logging.basicConfig(level=logging.INFO,
                     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="LiveMART API")
+app = FastAPI(title="LiveMART API", default_response_class=ORJSONResponse)
 
 # ==================== FIXED CORS ====================
-origins = [
+origins = frozenset({
     "http://localhost:3000",
     "http://127.0.0.1:3000",
     "https://blueprint-web-6.preview.emergentagent.com",
-]
+})
+
+class FastPathCORSMiddleware(CORSMiddleware):
+    # Requests without an Origin header (same-origin, server-to-server) skip
+    # CORS handling before Starlette parses the headers.
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not any(k == b"origin" for k, _ in scope["headers"]):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
 
 app.add_middleware(
-    CORSMiddleware,
+    FastPathCORSMiddleware,
     allow_origins=origins,         # 👈 your frontends
     allow_credentials=True,
     allow_methods=["*"],
@@ -42,13 +89,70 @@ app.add_middleware(
 )
 
 # ==================== ROUTER SETUP ====================
-api_router = APIRouter(prefix="/api")
+class ORJSONRequest(Request):
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            self._json = orjson.loads(await self.body())
+        return self._json
+
+class FastRoute(APIRoute):
+    # Parse JSON request bodies with orjson instead of the stdlib json module.
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def orjson_route_handler(request: Request) -> Response:
+            return await handler(ORJSONRequest(request.scope, request.receive))
+
+        return orjson_route_handler
+
+api_router = APIRouter(prefix="/api", route_class=FastRoute)
 
 client: AsyncIOMotorClient | None = None
 db = None
 mongo_connected = False
+# Collection handles with explicit write concerns, bound in startup_event.
+users_col = None
+categories_col = None
+# Registration relies on the unique email index; until it exists, register
+# falls back to checking for an existing user first.
+email_index_ready = False
+
+# Decoded JWT claims keyed by a token digest; entries are re-checked against
+# "exp" on hit, so a cached token never outlives its own expiry.
+_jwt_cache: TTLCache = TTLCache(maxsize=10_000, ttl=JWT_CACHE_TTL)
+_jwt_cache_lock = threading.Lock()
+_JWT = jwt.PyJWT()
+_SECRET_BYTES = SECRET_KEY.encode("utf-8")
+
+# Serialized public listings (categories, products). Per process only; the
+# writing worker invalidates its own copy, others catch up within the TTL.
+_listing_cache: TTLCache = TTLCache(maxsize=128, ttl=LISTING_CACHE_TTL)
+# Non-default product pages get their own small cache, so a client walking
+# arbitrary skip/limit values cannot evict the main listings above.
+_product_page_cache: TTLCache = TTLCache(maxsize=32, ttl=LISTING_CACHE_TTL)
+# Bumped on every invalidation; a miss that was already reading from Mongo when
+# it changed does not store its (possibly stale) result.
+_listing_generation = 0
+
+# Recent (password, stored hash) verdicts, so repeated guesses or test logins
+# within a few seconds skip the hash. Keyed on the stored hash as well, so a
+# password change can never be masked.
+_verify_cache: TTLCache = TTLCache(maxsize=1024, ttl=5)
+
+# In-flight credential checks, so a burst of identical logins hashes once.
+_login_inflight: Dict[bytes, asyncio.Task] = {}
+# Strong references to fire-and-forget hash upgrades until they finish.
+_rehash_tasks: set = set()
 
 # ==================== MODELS ====================
+_UTC = timezone.utc
+
+def _now() -> datetime:
+    return datetime.now(_UTC)
+
+def _new_id() -> str:
+    return str(uuid.uuid4())
+
 class UserBase(BaseModel):
     email: EmailStr
     name: str
@@ -62,8 +166,8 @@ class UserCreate(UserBase):
 
 class User(UserBase):
     model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    id: str = Field(default_factory=_new_id)
+    created_at: datetime = Field(default_factory=_now)
     verified: bool = False
 
 class UserLogin(BaseModel):
@@ -77,7 +181,7 @@ class Token(BaseModel):
 
 class Category(BaseModel):
     model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=_new_id)
     name: str
     description: Optional[str] = None
     image_url: Optional[str] = None
@@ -97,72 +201,169 @@ class ProductCreate(ProductBase):
 
 class Product(ProductBase):
     model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=_new_id)
     seller_id: str
     seller_name: Optional[str] = None
     rating: float = 0.0
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=_now)
+    updated_at: datetime = Field(default_factory=_now)
 
-# ==================== HELPERS ====================
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+_PRODUCT_LIST_TA = TypeAdapter(List[Product])
+
+# Dedicated pool for password hashing so a login flood cannot grow threads
+# without bound or starve the default executor used for sync work. Sized by
+# HASH_WORKERS (CPU share and memory budget, see CONFIG).
+_HASH_EXECUTOR = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="pwhash")
+_password_hasher = PasswordHasher(time_cost=ARGON2_TIME_COST,
+                                  memory_cost=ARGON2_MEMORY_COST,
+                                  parallelism=ARGON2_PARALLELISM)
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+# Login needs the password hash plus whatever the returned User exposes.
+LOGIN_PROJECTION = {"_id": 0, "password": 1, **{field: 1 for field in User.model_fields}}
+
+# ==================== HELPERS ====================
+# New hashes are Argon2id; bcrypt ("$2b$...") hashes from older accounts still
+# verify and are upgraded on the next successful login. Both libraries release
+# the GIL, so _HASH_EXECUTOR keeps the event loop free. Hashes are stored as
+# raw bytes (BSON binary); str hashes from older user documents are accepted.
+def _verify_password_sync(password: str, hashed: bytes) -> bool:
+    if hashed.startswith(b"$argon2"):
+        try:
+            return _password_hasher.verify(hashed, password)
+        except (VerificationError, InvalidHashError):
+            return False
+    return bcrypt.checkpw(password.encode("utf-8"), hashed)
+
+async def hash_password(password: str) -> bytes:
+    loop = asyncio.get_running_loop()
+    hashed = await loop.run_in_executor(_HASH_EXECUTOR, _password_hasher.hash, password)
+    return hashed.encode("ascii")
+
+async def verify_password(password: str, hashed: bytes | str) -> bool:
+    if isinstance(hashed, str):
+        hashed = hashed.encode("utf-8")
+    key = hashlib.sha256(password.encode("utf-8") + b"\0" + hashed).digest()
+    verdict = _verify_cache.get(key)
+    if verdict is None:
+        loop = asyncio.get_running_loop()
+        verdict = await loop.run_in_executor(_HASH_EXECUTOR, _verify_password_sync, password, hashed)
+        _verify_cache[key] = verdict
+    return verdict
+
+def password_needs_rehash(hashed: bytes | str) -> bool:
+    if isinstance(hashed, str):
+        hashed = hashed.encode("utf-8")
+    return not hashed.startswith(b"$argon2") or _password_hasher.check_needs_rehash(hashed)
+
+def _token_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode("utf-8")).digest()[:16]
 
 def create_access_token(data: dict):
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-
-def serialize_datetime(obj):
-    if isinstance(obj, dict):
-        return {k: serialize_datetime(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [serialize_datetime(i) for i in obj]
-    elif isinstance(obj, datetime):
-        return obj.isoformat()
-    return obj
-
-def deserialize_datetime(obj):
-    if isinstance(obj, dict):
-        out = {}
-        for k, v in obj.items():
-            if k in ["created_at", "updated_at"] and isinstance(v, str):
-                try:
-                    out[k] = datetime.fromisoformat(v)
-                except:
-                    out[k] = v
-            else:
-                out[k] = deserialize_datetime(v)
-        return out
-    elif isinstance(obj, list):
-        return [deserialize_datetime(i) for i in obj]
-    return obj
+    to_encode["exp"] = int(time.time()) + ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    token = _JWT.encode(to_encode, _SECRET_BYTES, algorithm=ALGORITHM)
+    # Freshly issued tokens are usually presented right back; prime the cache.
+    with _jwt_cache_lock:
+        _jwt_cache[_token_key(token)] = to_encode
+    return token
+
+def decode_access_token(token: str) -> dict:
+    key = _token_key(token)
+    with _jwt_cache_lock:
+        payload = _jwt_cache.get(key)
+    if payload and payload["exp"] > time.time():
+        return payload
+    payload = _JWT.decode(token, _SECRET_BYTES, algorithms=[ALGORITHM])
+    with _jwt_cache_lock:
+        _jwt_cache[key] = payload
+    return payload
+
+async def cached_listing(key: str, make_cursor: Callable, adapter: Optional[TypeAdapter] = None,
+                         cache: TTLCache = _listing_cache) -> Response:
+    # The cursor is only built on a miss, so hits never touch Mongo.
+    body = cache.get(key)
+    if body is None:
+        generation = _listing_generation
+        docs = [doc async for doc in make_cursor()]
+        if adapter is None:
+            body = orjson.dumps(docs)
+        else:
+            body = adapter.dump_json(adapter.validate_python(docs))
+        if generation == _listing_generation:
+            cache[key] = body
+    return Response(content=body, media_type="application/json")
+
+def invalidate_listing(key: str):
+    global _listing_generation
+    _listing_generation += 1
+    _listing_cache.pop(key, None)
 
 def send_otp(phone: str) -> bool:
     logger.info(f"Mock OTP sent to {phone}: 123456")
     return True
 
 # ==================== STARTUP / SHUTDOWN ====================
+async def ensure_indexes():
+    global email_index_ready
+    try:
+        await users_col.create_index("email", unique=True)
+        email_index_ready = True
+    except Exception as e:
+        logger.exception("Failed to create unique users.email index; "
+                         "register falls back to a lookup: %s", e)
+    # Each index on its own, so one failure does not skip the rest.
+    for col, keys, unique in (
+        (users_col, "id", True),
+        (users_col, "role", False),
+        (categories_col, "id", True),
+        (db.products, "id", True),
+        (db.products, [("category_id", 1)], False),
+        (db.products, [("seller_id", 1), ("id", 1)], False),
+    ):
+        try:
+            await col.create_index(keys, unique=unique)
+        except Exception as e:
+            logger.exception("Failed to create index %s on %s: %s", keys, col.name, e)
+
 @app.on_event("startup")
 async def startup_event():
-    global client, db, mongo_connected
+    global client, db, users_col, categories_col, mongo_connected
+    logger.info("Event loop: %s", type(asyncio.get_running_loop()).__module__)
+    started = time.perf_counter()
+    await hash_password("startup-benchmark")
+    logger.info("argon2id t=%d m=%dKiB p=%d: %.0f ms per hash, %d hash workers "
+                "(up to %d MiB in flight)", ARGON2_TIME_COST, ARGON2_MEMORY_COST,
+                ARGON2_PARALLELISM, (time.perf_counter() - started) * 1000, HASH_WORKERS,
+                HASH_WORKERS * ARGON2_MEMORY_COST // 1024)
     if not MONGO_URL:
         logger.error("MONGO_URL not set.")
         mongo_connected = False
         return
     try:
-        client = AsyncIOMotorClient(MONGO_URL)
+        # tz_aware so BSON dates come back as UTC-aware datetimes.
+        client = AsyncIOMotorClient(
+            MONGO_URL,
+            tz_aware=True,
+            maxPoolSize=MONGO_MAX_POOL,
+            minPoolSize=MONGO_MIN_POOL,
+            serverSelectionTimeoutMS=2000,
+            compressors=MONGO_COMPRESSORS,
+            zlibCompressionLevel=6,
+            retryWrites=True,
+            uuidRepresentation="standard",
+        )
         db = client[DB_NAME]
+        # Accounts must survive a failover; categories are cheap to recreate.
+        users_col = db.users.with_options(write_concern=WriteConcern(w="majority", j=True))
+        categories_col = db.categories.with_options(write_concern=WriteConcern(w=1, j=False))
         await client.admin.command("ping")
         mongo_connected = True
         logger.info("Connected to MongoDB successfully.")
     except Exception as e:
         logger.exception("Failed to connect MongoDB: %s", e)
         mongo_connected = False
+        return
+    await ensure_indexes()
 
 @app.on_event("shutdown")
 async def shutdown_event():
@@ -172,41 +373,73 @@ async def shutdown_event():
         logger.info("MongoDB client closed.")
 
 # ==================== ROOT ====================
+_HEALTH_BASE = {
+    "message": "Live MART API",
+    "version": "1.0.0",
+    "status": "running",
+    "allowed_origins": sorted(origins),
+}
+_HEALTH_UP = orjson.dumps({**_HEALTH_BASE, "mongodb": "connected"})
+_HEALTH_DOWN = orjson.dumps({**_HEALTH_BASE, "mongodb": "disconnected"})
+
 @app.get("/", tags=["health"])
 async def health_check():
-    return {
-        "message": "Live MART API",
-        "version": "1.0.0",
-        "status": "running",
-        "mongodb": "connected" if mongo_connected else "disconnected",
-        "allowed_origins": origins,
-    }
+    body = _HEALTH_UP if mongo_connected else _HEALTH_DOWN
+    return Response(content=body, media_type="application/json")
 
 # ==================== AUTH ROUTES ====================
+async def upgrade_password_hash(email: str, old_hash: bytes | str, password: str):
+    # Best effort: matching on the old hash never overwrites a newer password.
+    try:
+        await users_col.update_one({"email": email, "password": old_hash},
+                                   {"$set": {"password": await hash_password(password)}})
+    except Exception as e:
+        logger.exception("Failed to upgrade password hash for %s: %s", email, e)
+
+async def authenticate_user(email: str, password: str) -> Optional[dict]:
+    user_doc = await users_col.find_one({"email": email}, LOGIN_PROJECTION)
+    if not user_doc:
+        return None
+    hashed = user_doc.pop("password")
+    if not await verify_password(password, hashed):
+        return None
+    if password_needs_rehash(hashed):
+        task = asyncio.create_task(upgrade_password_hash(email, hashed, password))
+        _rehash_tasks.add(task)
+        task.add_done_callback(_rehash_tasks.discard)
+    return user_doc
+
 @api_router.post("/auth/register", response_model=Token)
-async def register(user_data: UserCreate):
-    existing = await db.users.find_one({"email": user_data.email}, {"_id": 0})
-    if existing:
+async def register(user_data: UserCreate, background_tasks: BackgroundTasks):
+    if not email_index_ready and await users_col.find_one({"email": user_data.email}, {"_id": 1}):
         raise HTTPException(status_code=400, detail="Email already registered")
-    hashed = hash_password(user_data.password)
+    hashed = await hash_password(user_data.password)
     user_dict = user_data.model_dump()
     user_dict.pop("password")
     user = User(**user_dict)
     doc = user.model_dump()
     doc["password"] = hashed
-    doc = serialize_datetime(doc)
-    await db.users.insert_one(doc)
-    send_otp(user.phone)
+    try:
+        await users_col.insert_one(doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    background_tasks.add_task(send_otp, user.phone)
     token = create_access_token({"sub": user.email, "user_id": user.id, "role": user.role})
     return Token(access_token=token, user=user)
 
 @api_router.post("/auth/login", response_model=Token)
 async def login(credentials: UserLogin):
-    user_doc = await db.users.find_one({"email": credentials.email}, {"_id": 0})
-    if not user_doc or not verify_password(credentials.password, user_doc["password"]):
+    key = hashlib.blake2b(f"{credentials.email}\0{credentials.password}".encode("utf-8"),
+                          digest_size=16).digest()
+    task = _login_inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(authenticate_user(credentials.email, credentials.password))
+        _login_inflight[key] = task
+        task.add_done_callback(lambda _: _login_inflight.pop(key, None))
+    # shield: one caller disconnecting must not cancel the check for the others.
+    user_doc = await asyncio.shield(task)
+    if not user_doc:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    user_doc = deserialize_datetime(user_doc)
-    user_doc.pop("password")
     user = User(**user_doc)
     token = create_access_token({"sub": user.email, "user_id": user.id, "role": user.role})
     return Token(access_token=token, user=user)
@@ -218,21 +451,59 @@ async def verify_otp(data: Dict[str, str]):
     return {"success": False, "message": "Invalid OTP"}
 
 # ==================== CATEGORY ENDPOINTS ====================
-@api_router.get("/categories", response_model=List[Category])
+# Returns the stored category documents as-is, without response_model
+# re-validation.
+@api_router.get("/categories")
 async def get_categories():
-    return await db.categories.find({}, {"_id": 0}).to_list(1000)
+    response = await cached_listing(
+        "categories",
+        lambda: categories_col.find({}, {"_id": 0}).limit(1000).batch_size(200))
+    # Categories change rarely; let browsers and CDNs reuse the listing too.
+    # CORS headers depend on Origin, so shared caches must key on it; set it on
+    # every response, since the CORS middleware only adds it for allowed origins.
+    response.headers["Cache-Control"] = f"public, max-age={LISTING_CACHE_TTL}"
+    response.headers["Vary"] = "Origin"
+    return response
 
 @api_router.post("/categories", response_model=Category)
 async def create_category(category_data: Dict[str, Any]):
     cat = Category(**category_data)
-    await db.categories.insert_one(cat.model_dump())
+    try:
+        await categories_col.insert_one(cat.model_dump())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Category id already exists")
+    invalidate_listing("categories")
     return cat
 
 # ==================== PRODUCT ENDPOINTS ====================
-@api_router.get("/products", response_model=List[Product])
-async def get_products():
-    products = await db.products.find({}, {"_id": 0}).to_list(1000)
-    return [deserialize_datetime(p) for p in products]
+# Stored documents go through _PRODUCT_LIST_TA in one validate/dump pass, so the
+# response has the Product shape with defaults filled (e.g. a missing
+# updated_at becomes the current time); FastAPI's response_model is not used.
+@api_router.get("/products")
+async def get_products(skip: int = Query(0, ge=0, le=100_000),
+                       limit: int = Query(1000, ge=1, le=1000)):
+    def make_cursor():
+        return (db.products.find({}, {"_id": 0})
+                .sort("_id", 1).skip(skip).limit(limit).batch_size(min(limit, 200)))
+    if skip == 0 and limit == 1000:
+        return await cached_listing("products", make_cursor, _PRODUCT_LIST_TA)
+    return await cached_listing(f"products:{skip}:{limit}", make_cursor, _PRODUCT_LIST_TA,
+                                cache=_product_page_cache)
 
 # ==================== ROUTER INCLUDE ====================
-app.include_router(api_router)
\ No newline at end of file
+app.include_router(api_router)
+
+# ==================== ENTRYPOINT ====================
+# `uvicorn server:app` also picks uvloop/httptools automatically when installed.
+# Its --workers defaults to WEB_CONCURRENCY; an explicit `--workers N` without
+# the env var is invisible to the workers, which then size the Mongo and hash
+# pools as if they were alone on the host. Set WEB_CONCURRENCY instead.
+# `python server.py` runs one worker per available core unless WEB_CONCURRENCY
+# says otherwise, and exports the count so the spawned workers divide the pools.
+if __name__ == "__main__":
+    import uvicorn
+
+    workers = int(os.getenv("WEB_CONCURRENCY", 0)) or _available_cpus()
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    uvicorn.run("server:app", host="0.0.0.0", port=int(os.getenv("PORT", 8001)),
+                loop="uvloop", http="httptools", workers=workers, backlog=4096)